@@ -1,11 +1,21 @@
-def connect_google_sheets(spreadsheet_id: str):
+import os
+import streamlit as st
+
+
+@st.cache_resource
+def _get_gspread_client():
    
     import gspread
     from oauth2client.service_account import ServiceAccountCredentials
     
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    credentials = ServiceAccountCredentials.from_json_keyfile_name("C:/Users/HP/Desktop/AI Agent2.0/venv/credentials.json", scope)
-    client = gspread.authorize(credentials)
+    credentials = ServiceAccountCredentials.from_json_keyfile_name(os.getenv("GOOGLE_CREDS_PATH", "credentials.json"), scope)
+    return gspread.authorize(credentials)
+
+
+@st.cache_data(ttl=300)
+def connect_google_sheets(spreadsheet_id: str):
+    client = _get_gspread_client()
     
     sheet = client.open_by_key(spreadsheet_id)
     worksheet = sheet.get_worksheet(0) 
@@ -1,35 +1,269 @@
 import os
-from groq import Groq
+import asyncio
+from groq import Groq, AsyncGroq, BadRequestError
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Iterator, Tuple, Callable, Optional
 import json
+import re
+import string
+import hashlib
+from functools import lru_cache
+from diskcache import Cache
+from search import SRResult
+
+# Module-level so cached responses survive Streamlit reruns
+_cache = Cache(".llm_cache", size_limit=1 << 30)
+CACHE_TTL = 86400
+# Single-lookup miss marker; `key in _cache` then `_cache[key]` races expiry
+_MISSING = object()
+
+# System prompts are sent byte-identical on every call so the server can reuse
+# their prefix; everything that varies per entity lives in the user message.
+_SYSTEM = "Extract the answer. Output one short line. 'Not found' if absent."
+_BATCH_SYSTEM = """For each item, extract ONLY the information that directly answers its query.
+Return a JSON object mapping each item number to its answer, e.g. {"0": "...", "1": "..."}.
+Each answer must be a single, concise line. Use "Not found" if the information is absent."""
+
+_PROMPT_TMPL = string.Template("Q: $query\n$results\nA:")
+_BATCH_ITEM_TMPL = string.Template("ITEM $idx: $entity\nQUERY: $query\nSEARCH RESULTS:\n$results")
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """
+    Load the tokenizer on first use; a cold cache downloads it, so never at import time
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def _count_tokens(text: str) -> int:
+    """
+    Token estimate for batch packing; falls back to ~4 chars per token without tiktoken
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4
+
+
+@lru_cache(maxsize=1024)
+def _prefix_re(entity: str) -> re.Pattern:
+    """
+    Compiled matcher for the label prefixes the model sometimes puts before its answer
+    """
+    return re.compile(
+        r'^(?:(?:answer|response|result|the answer is|information|' + re.escape(entity) + r')\s*:\s*)+',
+        re.IGNORECASE
+    )
 
 class LLMProcessor:
     def __init__(self, api_key: str):
         self.client = Groq(api_key=api_key)
-        self.model = "llama3-8b-8192"
+        self.aclient = AsyncGroq(api_key=api_key)
+        self.model = "llama-3.1-8b-instant"
+        self.batch_size = 16
+        self.max_prompt_tokens = 6000
+        self.max_concurrency = 10
 
     def process_results(self, results: List[Dict], query_template: str) -> pd.DataFrame:
         """
         Process search results with improved prompt engineering and result handling
         """
-        extracted_data = []
+        extracted_data, pending, queries = self._split_answerable(results, query_template)
+
+        for batch_idx in self._batch_indices(results, pending, queries):
+            processed = self._process_batch([results[i] for i in batch_idx], [queries[i] for i in batch_idx])
+            for idx, processed_result in zip(batch_idx, processed):
+                extracted_data[idx] = processed_result
 
-        for result in results:
+        return pd.DataFrame(extracted_data)
+
+    async def process_results_async(self, results: List[Dict], query_template: str) -> pd.DataFrame:
+        """
+        Async variant of process_results that sends batches to Groq concurrently
+        """
+        return pd.DataFrame(await self._extract_async(results, query_template))
+
+    async def _extract_async(self, results: List[Dict], query_template: str,
+                             on_results: Optional[Callable[[List[Dict]], None]] = None) -> List[Dict]:
+        """
+        Extract answers for all results, keeping at most max_concurrency batches in flight
+        """
+        sem = asyncio.Semaphore(self.max_concurrency)
+        extracted_data, pending, queries = self._split_answerable(results, query_template)
+        if on_results and len(pending) < len(results):
+            on_results([processed for processed in extracted_data if processed is not None])
+
+        async def run_batch(batch_idx: List[int]):
+            async with sem:
+                processed = await self._process_batch_async(
+                    [results[i] for i in batch_idx], [queries[i] for i in batch_idx]
+                )
+            for idx, processed_result in zip(batch_idx, processed):
+                extracted_data[idx] = processed_result
+            if on_results:
+                on_results(processed)
+
+        await asyncio.gather(*[run_batch(batch_idx) for batch_idx in self._batch_indices(results, pending, queries)])
+        return extracted_data
+
+    def _split_answerable(self, results: List[Dict], query_template: str) -> Tuple[List[Optional[Dict]], List[int], List[Optional[str]]]:
+        """
+        Fill in "Not found" rows for failed searches and collect the query for each row still to be answered
+        """
+        extracted_data = [None] * len(results)
+        pending = []
+        queries = [None] * len(results)
+
+        for idx, result in enumerate(results):
             if not result.get('search_results') or result.get('error'):
-                extracted_data.append({
+                extracted_data[idx] = {
                     "entity": result['entity'],
                     "extracted_info": "Not found",
                     "confidence": 0.0
-                })
+                }
                 continue
 
-            processed_result = self._process_single_result(result, query_template)
-            extracted_data.append(processed_result)
+            pending.append(idx)
+            # Reuse the query the search phase already formatted
+            queries[idx] = result.get('query') or query_template.format(entity=result['entity'])
 
-        return pd.DataFrame(extracted_data)
+        return extracted_data, pending, queries
+
+    def _batch_indices(self, results: List[Dict], pending: List[int], queries: List[Optional[str]]) -> Iterator[List[int]]:
+        """
+        Greedily pack pending result indices into batches that fit max_prompt_tokens
+        """
+        batch, batch_tokens = [], 0
+        for idx in pending:
+            result = results[idx]
+            tokens = (_count_tokens(self._format_search_results(result['search_results']))
+                      + _count_tokens(queries[idx]) + 20)
+            if batch and (batch_tokens + tokens > self.max_prompt_tokens or len(batch) >= self.batch_size):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(idx)
+            batch_tokens += tokens
+
+        if batch:
+            yield batch
+
+    def _process_batch(self, results: List[Dict], queries: List[str]) -> List[Dict]:
+        """
+        Answer several entities with one LLM call, falling back per entity on bad output
+        """
+        if len(results) == 1:
+            return [self._process_single_result(results[0], queries[0])]
+
+        prompt = self._construct_batch_prompt(results, queries)
+        if _count_tokens(prompt) > self.max_prompt_tokens:
+            mid = len(results) // 2
+            return (self._process_batch(results[:mid], queries[:mid])
+                    + self._process_batch(results[mid:], queries[mid:]))
+
+        try:
+            answers = self._parse_batch_response(
+                self._get_llm_response(prompt, **self._batch_overrides(results))
+            )
+        except Exception as e:
+            if not self._is_malformed_json(e):
+                return self._batch_error(results, e)
+            answers = {}
+
+        processed = []
+        for idx, result in enumerate(results):
+            answer = answers.get(str(idx))
+            if isinstance(answer, str) and answer.strip():
+                processed.append(self._validate_response(answer, result['entity']))
+            else:
+                processed.append(self._process_single_result(result, queries[idx]))
+
+        return processed
 
-    def _process_single_result(self, result: Dict, query_template: str) -> Dict:
+    async def _process_batch_async(self, results: List[Dict], queries: List[str]) -> List[Dict]:
+        """
+        Async variant of _process_batch
+        """
+        if len(results) == 1:
+            return [await self._process_single_result_async(results[0], queries[0])]
+
+        prompt = self._construct_batch_prompt(results, queries)
+        if _count_tokens(prompt) > self.max_prompt_tokens:
+            mid = len(results) // 2
+            first, second = await asyncio.gather(
+                self._process_batch_async(results[:mid], queries[:mid]),
+                self._process_batch_async(results[mid:], queries[mid:])
+            )
+            return first + second
+
+        try:
+            answers = self._parse_batch_response(
+                await self._get_llm_response_async(prompt, **self._batch_overrides(results))
+            )
+        except Exception as e:
+            if not self._is_malformed_json(e):
+                return self._batch_error(results, e)
+            answers = {}
+
+        async def answer_row(idx: int, result: Dict) -> Dict:
+            answer = answers.get(str(idx))
+            if isinstance(answer, str) and answer.strip():
+                return self._validate_response(answer, result['entity'])
+            return await self._process_single_result_async(result, queries[idx])
+
+        return list(await asyncio.gather(*[answer_row(idx, result) for idx, result in enumerate(results)]))
+
+    def _batch_overrides(self, results: List[Dict]) -> Dict:
+        """
+        Completion parameters for a batched JSON prompt
+        """
+        return {
+            "system": _BATCH_SYSTEM,
+            "max_tokens": 100 * len(results),
+            "stop": None,
+            "response_format": {"type": "json_object"}
+        }
+
+    def _is_malformed_json(self, error: Exception) -> bool:
+        """
+        True when the batch failed only because the model's JSON was unusable
+        """
+        if isinstance(error, json.JSONDecodeError):
+            return True
+        return isinstance(error, BadRequestError) and "json_validate_failed" in str(error)
+
+    def _batch_error(self, results: List[Dict], error: Exception) -> List[Dict]:
+        """
+        Mark every row of a failed batch without retrying each one individually
+        """
+        return [
+            {
+                "entity": result['entity'],
+                "extracted_info": "Error in processing",
+                "confidence": 0.0,
+                "error": str(error)
+            }
+            for result in results
+        ]
+
+    def _parse_batch_response(self, response: str) -> Dict:
+        """
+        Decode the batched JSON answer object, tolerating non-object replies
+        """
+        answers = json.loads(response)
+        return answers if isinstance(answers, dict) else {}
+
+    def _process_single_result(self, result: Dict, query: str) -> Dict:
         """
         Process a single result with enhanced prompt engineering
         """
@@ -37,7 +271,7 @@ class LLMProcessor:
         formatted_results = self._format_search_results(result['search_results'])
         
        
-        prompt = self._construct_prompt(result['entity'], query_template, formatted_results)
+        prompt = self._construct_prompt(result['entity'], query, formatted_results)
 
         try:
             response = self._get_llm_response(prompt)
@@ -54,7 +288,26 @@ class LLMProcessor:
                 "error": str(e)
             }
 
-    def _format_search_results(self, results: List[Dict]) -> str:
+    async def _process_single_result_async(self, result: Dict, query: str) -> Dict:
+        """
+        Async variant of _process_single_result using the AsyncGroq client
+        """
+        formatted_results = self._format_search_results(result['search_results'])
+        prompt = self._construct_prompt(result['entity'], query, formatted_results)
+
+        try:
+            response = await self._get_llm_response_async(prompt)
+            return self._validate_response(response, result['entity'])
+
+        except Exception as e:
+            return {
+                "entity": result['entity'],
+                "extracted_info": "Error in processing",
+                "confidence": 0.0,
+                "error": str(e)
+            }
+
+    def _format_search_results(self, results: List[SRResult]) -> str:
         """
         Format search results for better prompt context
         """
@@ -64,68 +317,95 @@ class LLMProcessor:
         formatted = []
         for idx, result in enumerate(results, 1):
             formatted.append(f"Result {idx}:\n"
-                           f"Title: {result.get('title', '')}\n"
-                           f"Snippet: {result.get('snippet', '')}\n"
-                           f"URL: {result.get('link', '')}\n")
+                           f"Title: {result.title}\n"
+                           f"Snippet: {result.snippet[:200]}\n"
+                           f"URL: {result.link}\n")
         
         return "\n".join(formatted)
 
-    def _construct_prompt(self, entity: str, query_template: str, formatted_results: str) -> str:
+    def _construct_prompt(self, entity: str, query: str, formatted_results: str) -> str:
         """
         Construct an optimized prompt for better extraction
         """
-        return f"""TASK: Extract specific information from web search results for {entity}.
-
-QUERY: {query_template.format(entity=entity)}
+        return _PROMPT_TMPL.substitute(query=query, results=formatted_results)
 
-INSTRUCTIONS:
-1. Analyze the search results below
-2. Extract ONLY the information that directly answers the query
-3. Provide the answer in a single, concise line
-4. If the specific information is not found, respond with "Not found"
-5. Do not include any explanations or additional context
-
-SEARCH RESULTS:
-{formatted_results}
-
-ANSWER:"""
+    def _construct_batch_prompt(self, results: List[Dict], queries: List[str]) -> str:
+        """
+        Pack several entities into one user message; the instructions live in _BATCH_SYSTEM
+        """
+        return "\n---\n".join(
+            _BATCH_ITEM_TMPL.substitute(
+                idx=idx,
+                entity=result['entity'],
+                query=query,
+                results=self._format_search_results(result['search_results'])
+            )
+            for idx, (result, query) in enumerate(zip(results, queries))
+        )
 
-    def _get_llm_response(self, prompt: str) -> str:
+    def _completion_params(self, prompt: str, system: str = _SYSTEM, **overrides) -> Dict:
         """
-        Get response from LLM with optimized parameters
+        Chat completion parameters shared by the sync and async clients
         """
-        chat_completion = self.client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are a precise information extractor. Provide only the exact information requested without any additional text or context."},
+        return {
+            "messages": [
+                {"role": "system", "content": system},
                 {"role": "user", "content": prompt}
             ],
-            model=self.model,
-            temperature=0.1, 
-            max_tokens=100,
-            top_p=0.95,
-            frequency_penalty=0.5,  
-            presence_penalty=0.5,   
-            stream=False
-        )
+            "model": self.model,
+            "temperature": 0,
+            "max_tokens": 40,
+            "top_p": 1,
+            "stop": ["\n"],
+            "stream": False,
+            **overrides
+        }
+
+    def _get_llm_response(self, prompt: str, **overrides) -> str:
+        """
+        Get response from LLM with optimized parameters
+        """
+        params = self._completion_params(prompt, **overrides)
+        key = self._cache_key(params)
+        cached = _cache.get(key, default=_MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        chat_completion = self.client.chat.completions.create(**params)
         
-        return chat_completion.choices[0].message.content.strip()
+        result = chat_completion.choices[0].message.content.strip()
+        _cache.set(key, result, expire=CACHE_TTL)
+        return result
+
+    async def _get_llm_response_async(self, prompt: str, **overrides) -> str:
+        """
+        Async variant of _get_llm_response
+        """
+        params = self._completion_params(prompt, **overrides)
+        key = self._cache_key(params)
+        cached = _cache.get(key, default=_MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        chat_completion = await self.aclient.chat.completions.create(**params)
+
+        result = chat_completion.choices[0].message.content.strip()
+        _cache.set(key, result, expire=CACHE_TTL)
+        return result
+
+    def _cache_key(self, params: Dict) -> str:
+        """
+        Hash the full request so a model or parameter change misses the cache
+        """
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
 
     def _validate_response(self, response: str, entity: str) -> Dict:
         """
         Validate and clean the LLM response
         """
        
-        cleaned_response = response.split('\n')[0].strip()
-        
-       
-        prefixes_to_remove = [
-            "Answer:", "Response:", "Result:", 
-            f"{entity}:", "The answer is:", "Information:"
-        ]
-        
-        for prefix in prefixes_to_remove:
-            if cleaned_response.startswith(prefix):
-                cleaned_response = cleaned_response[len(prefix):].strip()
+        first_line = response.strip().split('\n', 1)[0].strip()
+        cleaned_response = _prefix_re(entity).sub('', first_line, count=1).strip()
 
        
         confidence = 1.0 if cleaned_response.lower() != "not found" else 0.0
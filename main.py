@@ -2,12 +2,31 @@ import streamlit as st
 import pandas as pd
 import io
 import os
-from typing import List, Dict
+import json
+import hashlib
+import time
+import asyncio
+import aiohttp
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
-from search import SearchEngine
+from search import SearchEngine, CACHE_TTL
 from llm_processing import LLMProcessor
 from data_processing import connect_google_sheets
-import time
+
+@st.cache_data
+def _csv_bytes(results_df: pd.DataFrame) -> bytes:
+    """Serialize results to CSV once per distinct frame"""
+    return results_df.to_csv(index=False).encode('utf-8')
+
+
+@st.cache_data
+def _xlsx_bytes(results_df: pd.DataFrame) -> bytes:
+    """Serialize results to Excel once per distinct frame"""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+        results_df.to_excel(writer, sheet_name='Results', index=False)
+    return buffer.getvalue()
+
 
 class AIAgentApp:
     def __init__(self):
@@ -21,48 +40,145 @@ class AIAgentApp:
             
         self.search_engine = SearchEngine(self.serpapi_key)
         self.llm_processor = LLMProcessor(self.groq_api_key)
+        self.max_concurrency = 10
 
-    def process_entity_with_retry(self, entity: str, query_template: str, max_retries: int = 3) -> Dict:
-        """Process a single entity with retry logic"""
-        for attempt in range(max_retries):
-            try:
-                
-                search_result = self.search_engine._execute_search(
-                    entity, 
-                    query_template.format(entity=entity)
-                )
-                
-                if search_result.get('error'):
-                    raise Exception(search_result['error'])
-                
-                
-                processed_result = self.llm_processor._process_single_result(
-                    search_result,
-                    query_template
-                )
-                
-                return processed_result
-                
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    return {
-                        "entity": entity,
-                        "extracted_info": f"Error: {str(e)}",
-                        
-                    }
-                time.sleep(2 ** attempt)  
+    async def _search_entity(self, sem: asyncio.Semaphore, session: aiohttp.ClientSession,
+                             entity: str, query_template: str, max_retries: int = 3) -> Dict:
+        """Search a single entity with retry logic, bounded by the shared semaphore"""
+        async with sem:
+            for attempt in range(max_retries):
+                try:
+                    
+                    search_result = await self.search_engine._execute_search_async(
+                        session,
+                        entity, 
+                        query_template.format(entity=entity)
+                    )
+                    
+                    if search_result.get('error'):
+                        raise Exception(search_result['error'])
+                    
+                    return search_result
+                    
+                except Exception as e:
+                    if attempt == max_retries - 1:
+                        return {
+                            "entity": entity,
+                            "search_results": None,
+                            "error": str(e)
+                        }
+                    await asyncio.sleep(2 ** attempt)  
                 
         return {
             "entity": entity,
-            "extracted_info": "Failed after all retries",
-            
+            "search_results": None,
+            "error": "Failed after all retries"
         }
 
+    def _checkpoint_path(self, query_template: str) -> str:
+        """Checkpoint file for a query template (stable across processes, unlike hash())"""
+        digest = hashlib.sha256(query_template.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(".ckpt", f"{digest}.jsonl")
+
+    def _load_checkpoint(self, ckpt_path: str) -> Dict[str, Dict]:
+        """Load finished results keyed by canonical entity, ignoring checkpoints older than CACHE_TTL"""
+        done = {}
+        if os.path.exists(ckpt_path) and time.time() - os.path.getmtime(ckpt_path) > CACHE_TTL:
+            os.remove(ckpt_path)
+        if os.path.exists(ckpt_path):
+            with open(ckpt_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # partially written last line
+                    done[str(row['entity']).strip().lower()] = row
+        return done
+
+    def _append_checkpoint(self, ckpt_path: str, results: List[Dict]):
+        """Append successful results to the checkpoint and flush them to disk"""
+        rows = [
+            result for result in results
+            if not str(result.get('extracted_info', '')).startswith('Error')
+        ]
+        if not rows:
+            return
+        
+        os.makedirs(os.path.dirname(ckpt_path), exist_ok=True)
+        with open(ckpt_path, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _process_entities(self, entities: List[str], query_template: str, progress_bar,
+                                ckpt_path: Optional[str] = None) -> List[Dict]:
+        """Search all entities concurrently, then extract answers with concurrent batched LLM calls"""
+        sem = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=20, ttl_dns_cache=300, keepalive_timeout=60)
+        total_steps = 2 * len(entities)
+        completed = 0
+
+        def advance(steps: int = 1):
+            nonlocal completed
+            completed += steps
+            progress_bar.progress(min(completed / total_steps, 1.0))
+
+        def record(finished: List[Dict]):
+            # Persist before touching the UI: a Stop or widget click raises out of progress()
+            if ckpt_path:
+                self._append_checkpoint(ckpt_path, finished)
+            advance(len(finished))
+
+        async def search_and_advance(session: aiohttp.ClientSession, entity: str) -> Dict:
+            # Advance inside the task (not a done-callback) so Streamlit's
+            # rerun/stop exceptions propagate and cancel the remaining searches
+            search_result = await self._search_entity(sem, session, entity, query_template)
+            advance()
+            return search_result
+
+        async with aiohttp.ClientSession(connector=connector) as session:
+            search_results = await asyncio.gather(
+                *[search_and_advance(session, entity) for entity in entities]
+            )
+
+        results = [None] * len(entities)
+        answerable = []
+        for idx, (entity, search_result) in enumerate(zip(entities, search_results)):
+            if search_result.get('error'):
+                results[idx] = {
+                    "entity": entity,
+                    "extracted_info": f"Error: {search_result['error']}",
+                    
+                }
+                record([results[idx]])
+                continue
+
+            answerable.append((idx, search_result))
+
+        extracted = await self.llm_processor._extract_async(
+            [search_result for _, search_result in answerable],
+            query_template,
+            on_results=record
+        )
+        for (idx, _), processed_result in zip(answerable, extracted):
+            results[idx] = processed_result
+
+        return results
+
     def process_data(self, data: pd.DataFrame, main_column: str, query_template: str):
         """Process data with improved error handling and retries"""
         try:
           
-            entities = data[main_column].dropna().unique().tolist()
+            sources = data[main_column].dropna().astype(str)
+            canon = sources.str.strip().str.lower()
+            sources, canon = sources[canon != ""], canon[canon != ""]
+            
+            
+            unique_map = {}
+            for original, key in zip(sources, canon):
+                unique_map.setdefault(key, original.strip())
+            entities = list(unique_map.values())
             if not entities:
                 st.error("No valid entities found in the selected column.")
                 return
@@ -72,39 +188,45 @@ class AIAgentApp:
             results_container = st.container()
             error_container = st.container()
 
+            ckpt_path = self._checkpoint_path(query_template)
+            done = self._load_checkpoint(ckpt_path)
+            pending_keys = [key for key in unique_map if key not in done]
+            pending = [unique_map[key] for key in pending_keys]
+
             with progress_container:
                 st.info(f"Processing {len(entities)} unique entities...")
+                if len(pending) < len(entities):
+                    st.caption(f"Resuming: {len(entities) - len(pending)} entities restored from checkpoint.")
                 progress_bar = st.progress(0)
                 status_text = st.empty()
                 
             
-            results = []
-            failed_entities = []
+            if pending:
+                status_text.text(f"Processing {len(pending)} entities concurrently...")
+                fresh_results = asyncio.run(self._process_entities(pending, query_template, progress_bar, ckpt_path))
+                done.update(zip(pending_keys, fresh_results))
+            unique_results = [done[key] for key in unique_map]
+            
+            for result in unique_results:
+                result['success'] = not str(result.get('extracted_info', '')).startswith('Error')
             
-            for idx, entity in enumerate(entities):
-                status_text.text(f"Processing: {entity}")
-                
-                try:
-                    result = self.process_entity_with_retry(entity, query_template)
-                    results.append(result)
-                    
-                   
-                    if "Error" in str(result.get('extracted_info', '')):
-                        failed_entities.append(entity)
-                        
-                except Exception as e:
-                    failed_entities.append(entity)
-                    results.append({
-                        "entity": entity,
-                        "extracted_info": f"Error: {str(e)}",
-                       
-                    })
-                
-                
-                progress_bar.progress((idx + 1) / len(entities))
+            
+            results_by_canon = dict(zip(unique_map, unique_results))
+            results = [
+                {**results_by_canon[key], "entity": original}
+                for original, key in zip(sources, canon)
+            ]
+            
+            # Count failures per source row so they add up with the other metrics
+            failed_entities = [result['entity'] for result in results if not result['success']]
+            
+            # The checkpoint only exists to resume interrupted runs
+            if not failed_entities and os.path.exists(ckpt_path):
+                os.remove(ckpt_path)
             
            
-            results_df = pd.DataFrame(results)
+            st.session_state.results_df = pd.DataFrame.from_records(results)
+            st.session_state.failed_entities = failed_entities
             
            
             progress_bar.empty()
@@ -113,13 +235,15 @@ class AIAgentApp:
             
             with results_container:
                 st.success("Processing completed!")
-                self.display_results(results_df, failed_entities)
+                self.display_results()
             
         except Exception as e:
             st.error(f"An error occurred during processing: {str(e)}")
 
-    def display_results(self, results_df: pd.DataFrame, failed_entities: List[str]):
-        """Display results with improved download options and error reporting"""
+    def display_results(self):
+        """Display the results held in session state with download options and error reporting"""
+        results_df = st.session_state.results_df
+        failed_entities = st.session_state.failed_entities
         st.subheader("Results")
         
        
@@ -127,7 +251,7 @@ class AIAgentApp:
         with col1:
             st.metric("Total Processed", len(results_df))
         with col2:
-            successful = len(results_df[~results_df['extracted_info'].str.contains('Error', na=False)])
+            successful = int(results_df['success'].sum())
             st.metric("Successful", successful)
         with col3:
             st.metric("Failed", len(failed_entities))
@@ -147,10 +271,9 @@ class AIAgentApp:
         
         
         with col1:
-            csv = results_df.to_csv(index=False).encode('utf-8')
             st.download_button(
                 "Download CSV",
-                csv,
+                _csv_bytes(results_df),
                 "results.csv",
                 "text/csv",
                 key='download-csv'
@@ -158,14 +281,9 @@ class AIAgentApp:
         
         
         with col2:
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                results_df.to_excel(writer, sheet_name='Results', index=False)
-            buffer.seek(0)
-            
             st.download_button(
                 "Download Excel",
-                buffer,
+                _xlsx_bytes(results_df),
                 "results.xlsx",
                 "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 key='download-excel'
@@ -175,6 +293,10 @@ class AIAgentApp:
         """Main application logic"""
         st.title("AI Research Agent 🔍")
         
+        if 'results_df' not in st.session_state:
+            st.session_state.results_df = None
+            st.session_state.failed_entities = []
+        
        
         data_source = st.radio(
             "Select Data Source:",
@@ -212,11 +334,21 @@ class AIAgentApp:
                 placeholder="Example: What is the revenue of {entity} in 2023?"
             )
             
+            if st.button("Clear saved progress"):
+                ckpt_path = self._checkpoint_path(query_template)
+                if os.path.exists(ckpt_path):
+                    os.remove(ckpt_path)
+                st.session_state.results_df = None
+                st.session_state.failed_entities = []
+                st.info("Checkpoint for this query was removed. Cached search and LLM responses are kept for up to 24 hours.")
+            
             if st.button("Start Process", type="primary"):
                 if "{entity}" not in query_template:
                     st.error("Query must contain {entity} placeholder")
                 else:
                     self.process_data(data, main_column, query_template)
+            elif st.session_state.results_df is not None:
+                self.display_results()
 
 if __name__ == "__main__":
     app = AIAgentApp()
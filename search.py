@@ -1,6 +1,40 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import aiohttp
+import asyncio
 from typing import List, Dict
+from dataclasses import dataclass, asdict
 import time
+import hashlib
+from diskcache import Cache
+from aiolimiter import AsyncLimiter
+from ratelimit import limits, sleep_and_retry
+
+# Module-level so cached searches survive Streamlit reruns
+_cache = Cache(".search_cache", size_limit=1 << 30)
+CACHE_TTL = 86400
+# Single-lookup miss marker; `key in _cache` then `_cache[key]` races expiry
+_MISSING = object()
+# Bump when the cached result shape changes so stale entries are never read back
+CACHE_SCHEMA = "v2"
+
+# SerpAPI request budget (calls per second), shared by the sync and async paths
+SEARCH_RATE_LIMIT = 5
+
+
+@dataclass(slots=True)
+class SRResult:
+    """A single organic search result"""
+    title: str
+    link: str
+    snippet: str
+    position: int
+
+    def to_dict(self) -> Dict:
+        """Plain dict for JSON serialization"""
+        return asdict(self)
+
 
 class SearchEngine:
     def __init__(self, api_key: str):
@@ -9,6 +43,18 @@ class SearchEngine:
         self.max_retries = 3
         self.retry_delay = 2
 
+        # Keep-alive pool so every search reuses the same TLS connection.
+        # Retries stay in _execute_search, so the adapter itself never retries.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=20,
+            max_retries=Retry(total=0, raise_on_status=False)
+        )
+        self.session.mount("https://", adapter)
+
+        self.limiter = AsyncLimiter(max_rate=SEARCH_RATE_LIMIT, time_period=1)
+
     def search_entities(self, entities: List[str], query_template: str,) -> List[Dict]:
         """
         Enhanced search function with retry logic and better result filtering
@@ -19,9 +65,6 @@ class SearchEngine:
             query = query_template.format(entity=entity)
             result = self._execute_search(entity, query)
             results.append(result)
-            
-            
-            time.sleep(1)
         
         return results
 
@@ -29,18 +72,24 @@ class SearchEngine:
         """
         Execute search with retry logic and enhanced error handling
         """
+        key = self._cache_key(entity, query)
+        cached = _cache.get(key, default=_MISSING)
+        if cached is not _MISSING:
+            return {**cached, "entity": entity, "query": query}
+
+        result = self._execute_search_uncached(entity, query)
+        result["query"] = query
+        if not result.get('error'):
+            _cache.set(key, result, expire=CACHE_TTL)
+        return result
+
+    def _execute_search_uncached(self, entity: str, query: str) -> Dict:
+        """
+        Hit SerpAPI, bypassing the response cache
+        """
         for attempt in range(self.max_retries):
             try:
-                response = requests.get(
-                    self.base_url,
-                    params={
-                        "engine": "google",
-                        "q": query,
-                        "api_key": self.api_key,
-                        "num": 3 
-                    },
-                    timeout=10
-                )
+                response = self._rate_limited_get(query)
                 
                 if response.ok:
                     return self._process_response(entity, response)
@@ -64,35 +113,128 @@ class SearchEngine:
             "error": f"Request failed after {self.max_retries} attempts"
         }
 
+    @sleep_and_retry
+    @limits(calls=SEARCH_RATE_LIMIT, period=1)
+    def _rate_limited_get(self, query: str) -> requests.Response:
+        """
+        Single SerpAPI request, blocking only when the per-second budget is spent
+        """
+        return self.session.get(
+            self.base_url,
+            params={
+                "engine": "google",
+                "q": query,
+                "api_key": self.api_key,
+                "num": 3 
+            },
+            timeout=10
+        )
+
+    async def _execute_search_async(self, session: aiohttp.ClientSession, entity: str, query: str) -> Dict:
+        """
+        Async variant of _execute_search sharing the caller's aiohttp session
+        """
+        key = self._cache_key(entity, query)
+        cached = _cache.get(key, default=_MISSING)
+        if cached is not _MISSING:
+            return {**cached, "entity": entity, "query": query}
+
+        result = await self._execute_search_uncached_async(session, entity, query)
+        result["query"] = query
+        if not result.get('error'):
+            _cache.set(key, result, expire=CACHE_TTL)
+        return result
+
+    async def _execute_search_uncached_async(self, session: aiohttp.ClientSession, entity: str, query: str) -> Dict:
+        """
+        Async variant of _execute_search_uncached
+        """
+        for attempt in range(self.max_retries):
+            try:
+                await self.limiter.acquire()
+                async with session.get(
+                    self.base_url,
+                    params={
+                        "engine": "google",
+                        "q": query,
+                        "api_key": self.api_key,
+                        "num": 3
+                    },
+                    timeout=aiohttp.ClientTimeout(total=10)
+                ) as response:
+                    if response.ok:
+                        return await self._process_response_async(entity, response)
+
+                    if response.status == 429:  # Rate limit
+                        await asyncio.sleep(self.retry_delay * (attempt + 1))
+                        continue
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries - 1:
+                    return {
+                        "entity": entity,
+                        "search_results": None,
+                        "error": f"Request failed after {self.max_retries} attempts: {str(e)}"
+                    }
+                await asyncio.sleep(self.retry_delay)
+
+        return {
+            "entity": entity,
+            "search_results": None,
+            "error": f"Request failed after {self.max_retries} attempts"
+        }
+
+    def _cache_key(self, entity: str, query: str) -> str:
+        """
+        Normalized (entity, query) cache key
+        """
+        normalized = f"{CACHE_SCHEMA}\n{entity.strip().lower()}\n{' '.join(query.split()).lower()}"
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
     def _process_response(self, entity: str, response: requests.Response) -> Dict:
         """
         Process and filter search results
         """
         try:
-            data = response.json()
-            organic_results = data.get("organic_results", [])
-            
-            filtered_results = []
-            for result in organic_results:
-                processed_result = {
-                    "title": result.get("title"),
-                    "link": result.get("link"),
-                    "snippet": result.get("snippet"), 
-                    "position": result.get("position")
-                }
-                
-              
-                if all(processed_result.values()):
-                    filtered_results.append(processed_result)
-            
+            return self._filter_results(entity, response.json())
+        except Exception as e:
             return {
                 "entity": entity,
-                "search_results": filtered_results if filtered_results else "No relevant results found."
+                "search_results": None,
+                "error": f"Failed to process results: {str(e)}"
             }
-            
+
+    async def _process_response_async(self, entity: str, response: aiohttp.ClientResponse) -> Dict:
+        """
+        Process and filter search results from an aiohttp response
+        """
+        try:
+            return self._filter_results(entity, await response.json(content_type=None))
         except Exception as e:
             return {
                 "entity": entity,
                 "search_results": None,
                 "error": f"Failed to process results: {str(e)}"
             }
+
+    def _filter_results(self, entity: str, data: Dict) -> Dict:
+        """
+        Keep only complete organic results
+        """
+        organic_results = data.get("organic_results", [])
+
+        filtered_results = []
+        for result in organic_results:
+            title = result.get("title")
+            link = result.get("link")
+            snippet = result.get("snippet")
+            position = result.get("position")
+            
+          
+            if all((title, link, snippet, position)):
+                filtered_results.append(SRResult(title=title, link=link, snippet=snippet, position=position))
+        
+        return {
+            "entity": entity,
+            "search_results": filtered_results if filtered_results else "No relevant results found."
+        }